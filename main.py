@@ -1,74 +1,205 @@
+import argparse
+import asyncio
+import glob
+import stat
 import sys
 import os
-from scripts.convert_pdf import pdf_to_text, extract_first_n_pages
-from scripts.classify_context import classify_context
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from scripts.convert_pdf import pdf_to_text_or_ocr
+from scripts.classify_context import (
+    TXT_READ_CHARS, async_client_session, cached_result, classify_context_async, rate_limit_listeners, warm_up_async
+)
+from scripts.limiter import AdaptiveLimiter
 
+# Starting and maximum number of documents classified concurrently, split evenly between the
+# pools; the limit adapts to rate limiting, and to CLASSIFY_RPM (requests per minute) when it is set
+MAX_CONCURRENCY = int(os.environ.get("CLASSIFY_CONCURRENCY", 8))
+MAX_CONCURRENCY_CEILING = 32
+RATE_LIMIT_RPM = int(os.environ["CLASSIFY_RPM"]) if os.environ.get("CLASSIFY_RPM") else None
+# Documents below this many words go to the short pool so they never queue behind long ones
+SHORT_DOC_WORDS = 1000
+POOLS = ("short", "long")
 
-def main():
-    # Check for input PDF argument
-    if len(sys.argv) < 2:
-        #print("Usage: python main.py <input.pdf|input.txt>")
-        sys.exit(1)
-    input_pdf_path = sys.argv[1]
-    ext = os.path.splitext(input_pdf_path)[1].lower()
 
-    # Validate file existence
-    if not os.path.isfile(input_pdf_path):
-        print(f"File not found: {input_pdf_path}") 
-        sys.exit(1)
+class StreamPrinter:
+    """
+    Print classification fields as soon as they stabilize in a streamed response.
+    A field is stable once the model has moved on to the next one.
+    If the final result differs from what was streamed (the answer was escalated to the
+    fallback model), it is printed again in full as a revised result.
+    """
+    FIELDS = ("category", "subcategory", "summary", "key_themes")
+
+    def __init__(self):
+        self.printed = {}
+        self.themes_printed = []
+
+    def _emit(self, field, value):
+        if self.printed.get(field) == value:
+            return
+        self.printed[field] = value
+        if field == "category":
+            print(f"Category   : {value}", flush=True)
+        elif field == "subcategory":
+            print(f"Subcategory: {value}", flush=True)
+        elif field == "summary":
+            print(f"Summary    : {value}", flush=True)
+            print("Key Themes :", flush=True)
+
+    def _emit_themes(self, themes):
+        for idx in range(len(self.themes_printed), len(themes)):
+            print(f"  {idx + 1}. {themes[idx]}", flush=True)
+            self.themes_printed.append(themes[idx])
 
+    def update(self, partial):
+        """
+        Handle a partially parsed response dict from the stream.
+        """
+        for field, next_field in zip(self.FIELDS, self.FIELDS[1:]):
+            if field in partial and next_field in partial:
+                self._emit(field, partial[field])
+        # The last theme may still be growing
+        themes = partial.get("key_themes") or []
+        self._emit_themes(themes[:-1])
+
+    def finish(self, result):
+        """
+        Print whatever has not been printed yet from the final result.
+        """
+        conflicts = any(
+            self.printed.get(field, getattr(result, field)) != getattr(result, field)
+            for field in self.FIELDS[:-1]
+        ) or self.themes_printed != result.key_themes[:len(self.themes_printed)]
+        if conflicts:
+            print("Revised result:", flush=True)
+            self.printed = {}
+            self.themes_printed = []
+        self._emit("category", result.category)
+        self._emit("subcategory", result.subcategory)
+        self._emit("summary", result.summary)
+        self._emit_themes(result.key_themes)
+
+
+def extract_text(path, ext):
+    """
+    Read a TXT file (up to TXT_READ_CHARS characters) or extract the first 15 pages of a PDF as text,
+    falling back to OCR when the PDF has almost no text layer.
+    Runs in a worker process so PDF parsing does not block the event loop.
+    Returns (text, word_count).
+    """
     if ext == '.txt':
-        with open(input_pdf_path, 'r', encoding='utf-8') as f:
-            text_content = f.read()
-        words = text_content.split()
-        word_count = len(words)
-        if word_count > 3000:
-            words = words[:3000]
-            text_content = ' '.join(words)
-            word_count = 3000
-        try:
-            result = classify_context(text_content)
-            print(f"Category   : {result.category}")
-            print(f"Subcategory: {result.subcategory}")
-            print(f"Summary    : {result.summary}")
-            print("Key Themes :")
-            for idx, theme in enumerate(result.key_themes, 1):
-                print(f"  {idx}. {theme}")
-        except Exception as e:
-            print(f"Classification failed: {e}")
-        sys.exit(0)
-    elif ext == '.pdf':
-        # Read PDF bytes from the input path
-        with open(input_pdf_path, 'rb') as f:
-            pdf_bytes = f.read()
-
-        # Extract first 15 pages as a new PDF in memory
-        first5_pdf_bytes = extract_first_n_pages(pdf_bytes, n=15)
-
-        # Extract text from the new 15-page PDF
-        try:
-            text_content = pdf_to_text(first5_pdf_bytes, num_pages=15)
-        except Exception as e:
-            print(f"PDF text extraction failed: {e}")
-            sys.exit(1)
-
-        word_count = len(text_content.split())
-
-        try:
-            result = classify_context(text_content)
-            print(f"Category   : {result.category}")
-            print(f"Subcategory: {result.subcategory}")
-            print(f"Summary    : {result.summary}")
-            print("Key Themes :")
-            for idx, theme in enumerate(result.key_themes, 1):
-                print(f"  {idx}. {theme}")
-        except Exception as e:
-            print(f"Classification failed: {e}")
-
-    else:
+        # Never read the whole file; the head and tail that are classified are cut per request
+        with path.open('r', encoding='utf-8') as f:
+            text_content = f.read(TXT_READ_CHARS)
+        return text_content, len(text_content.split())
+
+    # Extract text from the first 15 pages, switching to OCR for scanned documents
+    return pdf_to_text_or_ocr(path.read_bytes(), num_pages=15)
+
+
+async def process_one(input_path, limiters, executor, stream, warm_up):
+    """
+    Extract and classify a single file, printing its result.
+    Returns False if the file could not be read, True otherwise.
+    """
+    path = Path(input_path)
+    ext = path.suffix.lower()
+
+    # Validate file existence with a single stat call
+    try:
+        is_file = stat.S_ISREG(path.stat().st_mode)
+    except OSError:
+        is_file = False
+    if not is_file:
+        print(f"File not found: {input_path}")
+        return False
+
+    if ext not in ('.txt', '.pdf'):
         #print(f"Unsupported file type: {ext}. Please provide a .pdf or .txt file.")
+        return False
+
+    loop = asyncio.get_running_loop()
+    try:
+        text_content, word_count = await loop.run_in_executor(executor, extract_text, path, ext)
+    except Exception as e:
+        print(f"PDF text extraction failed: {e}" if ext == '.pdf' else f"Failed to read {input_path}: {e}")
+        return False
+
+    printer = StreamPrinter()
+    limiter = limiters["short" if word_count < SHORT_DOC_WORDS else "long"]
+    await warm_up
+    try:
+        # Cache hits make no API call, so they must not feed the limiter's latency and success counts
+        result = cached_result(text_content)
+        if result is None:
+            async with limiter.slot():
+                # Only stream when a single file is processed, otherwise outputs would interleave
+                result = await classify_context_async(
+                    text_content, on_partial=printer.update if stream else None
+                )
+    except Exception as e:
+        # Caught outside the slot, so a failed call is not counted as a success
+        if not stream:
+            print(f"== {input_path}")
+        print(f"Classification failed: {e}")
+        return True
+
+    if not stream:
+        print(f"== {input_path}")
+    printer.finish(result)
+    return True
+
+
+async def process_all(input_paths):
+    # Each pool gets an equal share of the concurrency and RPM budgets, so together they stay within them
+    share = len(POOLS)
+    limiters = {
+        pool: AdaptiveLimiter(
+            max(1, MAX_CONCURRENCY // share),
+            max(1, MAX_CONCURRENCY_CEILING // share),
+            rpm=max(1, RATE_LIMIT_RPM // share) if RATE_LIMIT_RPM else None,
+        )
+        for pool in POOLS
+    }
+    # A 429 applies to the whole account, so every pool backs off
+    listeners = [limiter.rate_limited for limiter in limiters.values()]
+    rate_limit_listeners.extend(listeners)
+    try:
+        async with async_client_session():
+            # Fetch the prompt and open the API connection while the first files are being extracted
+            warm_up = asyncio.create_task(warm_up_async())
+            with ProcessPoolExecutor() as executor:
+                return await asyncio.gather(*[
+                    process_one(path, limiters, executor, stream=len(input_paths) == 1, warm_up=warm_up)
+                    for path in input_paths
+                ])
+    finally:
+        for listener in listeners:
+            rate_limit_listeners.remove(listener)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Classify PDF/TXT files into a legal context and subcategory."
+    )
+    parser.add_argument('paths', nargs='*', help="PDF or TXT files to classify")
+    parser.add_argument('--glob', action='append', default=[], help="Glob pattern of files to classify (repeatable)")
+    args = parser.parse_args()
+
+    input_paths = list(args.paths)
+    for pattern in args.glob:
+        input_paths.extend(sorted(glob.glob(pattern, recursive=True)))
+    input_paths = list(dict.fromkeys(input_paths))
+
+    # Check for input PDF argument
+    if not input_paths:
+        #print("Usage: python main.py <input.pdf|input.txt> [more files...] [--glob PATTERN]")
         sys.exit(1)
 
+    ok = asyncio.run(process_all(input_paths))
+    sys.exit(0 if all(ok) else 1)
+
 
 if __name__ == "__main__":
     main()
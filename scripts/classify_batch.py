@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Classify many PDF/TXT files in one OpenAI Batch API job (half the price of real-time calls).
+
+Usage:
+    python -m scripts.classify_batch "docs/*.pdf" "notes/*.txt"
+"""
+import argparse
+import glob
+import hashlib
+import io
+import os
+import sys
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import orjson
+from pydantic import ValidationError
+
+from scripts.classify_context import (
+    LANGUAGE_MODEL, RESPONSE_FORMAT, TXT_READ_CHARS, ClassificationResult, cache_result, get_system_prompt, openai_client,
+    parse_result, print_result, retry_transient, truncate_head_tail, valid_or_other
+)
+from scripts.convert_pdf import pdf_to_text_or_ocr
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+MAX_PAGES = 15
+
+
+def load_text(path: str) -> str:
+    """
+    Extract the text that would be classified for a single PDF or TXT file.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".txt":
+        with open(path, "r", encoding="utf-8") as f:
+            # Not token-cut here: build_request keeps the head and the tail of the text
+            return f.read(TXT_READ_CHARS)
+    if ext == ".pdf":
+        with open(path, "rb") as f:
+            pdf_bytes = f.read()
+        # Same extraction as main.py, so scanned PDFs are OCR'd rather than sent near-empty
+        return pdf_to_text_or_ocr(pdf_bytes, num_pages=MAX_PAGES)[0]
+    raise ValueError(f"Unsupported file type: {ext}")
+
+
+def build_request(custom_id: str, text: str, system_prompt: str) -> dict:
+    """
+    Build one JSONL line of a batch input file for the chat completions endpoint.
+    """
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": BATCH_ENDPOINT,
+        "body": {
+            "model": LANGUAGE_MODEL,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": truncate_head_tail(text)},
+            ],
+            "response_format": RESPONSE_FORMAT,
+            "temperature": 0,
+        },
+    }
+
+
+# Each Batch API call is retried on its own, so a transient error while polling
+# does not abandon a job that may run for hours
+@retry_transient
+def _upload_batch_input(jsonl: bytes) -> str:
+    return openai_client().files.create(file=("batch_input.jsonl", io.BytesIO(jsonl)), purpose="batch").id
+
+
+@retry_transient
+def _create_batch(input_file_id: str):
+    return openai_client().batches.create(input_file_id=input_file_id, endpoint=BATCH_ENDPOINT, completion_window="24h")
+
+
+@retry_transient
+def _retrieve_batch(batch_id: str):
+    return openai_client().batches.retrieve(batch_id)
+
+
+@retry_transient
+def _download_file(file_id: str) -> str:
+    return openai_client().files.content(file_id).text
+
+
+def submit_batch(texts: dict[str, str]) -> str:
+    """
+    Upload a JSONL file with one request per custom_id and start a batch job.
+    Returns the batch ID.
+    """
+    system_prompt = get_system_prompt()
+    jsonl = b"\n".join(
+        orjson.dumps(build_request(custom_id, text, system_prompt))
+        for custom_id, text in texts.items()
+    )
+    return _create_batch(_upload_batch_input(jsonl)).id
+
+
+def wait_for_batch(batch_id: str, poll_interval: float = 300.0, initial_interval: float = 5.0):
+    """
+    Poll a batch job until it reaches a terminal status and return it.
+    The wait between polls doubles from initial_interval up to poll_interval.
+    """
+    interval = min(initial_interval, poll_interval)
+    while True:
+        batch = _retrieve_batch(batch_id)
+        if batch.status in TERMINAL_STATUSES:
+            return batch
+        time.sleep(interval)
+        interval = min(interval * 2, poll_interval)
+
+
+def parse_results(output_jsonl: str) -> dict[str, ClassificationResult]:
+    """
+    Parse a batch output file into ClassificationResult objects keyed by custom_id.
+    Failed or invalid lines are reported with a warning and skipped; a subcategory that does
+    not belong to its category is filed under "other", as in classify_context.
+    """
+    results: dict[str, ClassificationResult] = {}
+    for line in output_jsonl.splitlines():
+        if not line.strip():
+            continue
+        record = orjson.loads(line)
+        custom_id = record["custom_id"]
+        response = record.get("response") or {}
+        if record.get("error") or response.get("status_code") != 200:
+            warnings.warn(f"Batch request {custom_id} failed: {record.get('error') or response}")
+            continue
+        content = response["body"]["choices"][0]["message"]["content"]
+        try:
+            results[custom_id] = valid_or_other(parse_result(content))
+        except ValidationError as e:
+            warnings.warn(f"Failed to validate batch result {custom_id}: {e}")
+    return results
+
+
+def run_batch(texts: dict[str, str], poll_interval: float = 300.0) -> dict[str, ClassificationResult]:
+    """
+    Classify a mapping of custom_id -> text through the Batch API and wait for the results.
+    """
+    batch = wait_for_batch(submit_batch(texts), poll_interval=poll_interval)
+    if batch.status != "completed" or not batch.output_file_id:
+        raise RuntimeError(f"Batch {batch.id} finished with status '{batch.status}'")
+    return parse_results(_download_file(batch.output_file_id))
+
+
+def start_batch(texts: list[str]) -> str:
+    """
+    Submit a list of texts as one batch job without waiting for it. Returns the batch ID.
+    """
+    return submit_batch({str(idx): text for idx, text in enumerate(texts)})
+
+
+def collect_batch(batch, texts: list[str]) -> list[ClassificationResult | None]:
+    """
+    Read the results of a finished job started with start_batch, in input order with None for
+    requests that failed. Results are stored in the classification cache, so the same documents
+    are not paid for again. Raises RuntimeError if the job itself did not complete.
+    """
+    if batch.status != "completed" or not batch.output_file_id:
+        raise RuntimeError(f"Batch {batch.id} finished with status '{batch.status}'")
+    results = parse_results(_download_file(batch.output_file_id))
+    ordered = [results.get(str(idx)) for idx in range(len(texts))]
+    for text, result in zip(texts, ordered):
+        if result is not None:
+            cache_result(text, result)
+    return ordered
+
+
+def poll_batch(batch_id: str, texts: list[str]) -> list[ClassificationResult | None] | None:
+    """
+    Check a job started with start_batch once. Returns None while it is still running,
+    otherwise the same as collect_batch.
+    """
+    batch = _retrieve_batch(batch_id)
+    if batch.status not in TERMINAL_STATUSES:
+        return None
+    return collect_batch(batch, texts)
+
+
+def classify_batch(texts: list[str], poll_interval: float = 300.0) -> list[ClassificationResult | None]:
+    """
+    Classify a list of texts through the Batch API, waiting for the job to finish.
+    Returns results in input order, with None for requests that failed.
+    """
+    return collect_batch(wait_for_batch(start_batch(texts), poll_interval=poll_interval), texts)
+
+
+def classify_files(paths: list[str], poll_interval: float = 300.0, max_workers: int = 8) -> dict[str, ClassificationResult]:
+    """
+    Extract text from each file in parallel, classify them in a single batch job,
+    and return results keyed by file path. Identical files are sent once.
+    Files are hashed on threads (I/O-bound) and text is extracted in worker processes,
+    since PyMuPDF parsing is CPU-bound and holds the GIL.
+    """
+    def file_hash(path: str) -> str:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        hashes = list(executor.map(file_hash, paths))
+    paths_by_hash: dict[str, list[str]] = {}
+    for path, digest in zip(paths, hashes):
+        paths_by_hash.setdefault(digest, []).append(path)
+    unique = list(paths_by_hash)
+    with ProcessPoolExecutor(max_workers=min(max_workers, os.cpu_count() or 1)) as executor:
+        texts = dict(zip(unique, executor.map(load_text, [paths_by_hash[h][0] for h in unique])))
+
+    results = run_batch(texts, poll_interval=poll_interval)
+    for digest, result in results.items():
+        cache_result(texts[digest], result)
+    return {
+        path: results[digest]
+        for digest, same_paths in paths_by_hash.items() if digest in results
+        for path in same_paths
+    }
+
+
+def main():
+    """
+    Command-line interface for classifying a set of files through the Batch API.
+    """
+    parser = argparse.ArgumentParser(
+        description="Classify PDF/TXT files in bulk through the OpenAI Batch API."
+    )
+    parser.add_argument('patterns', nargs='+', help="Files or glob patterns of PDF/TXT files")
+    parser.add_argument('--poll-interval', type=float, default=300.0, help="Maximum seconds between batch status checks")
+    args = parser.parse_args()
+
+    paths = sorted({
+        p for pattern in args.patterns for p in glob.glob(pattern)
+        if os.path.isfile(p) and os.path.splitext(p)[1].lower() in (".pdf", ".txt")
+    })
+    if not paths:
+        print("No matching files found.", file=sys.stderr)
+        sys.exit(1)
+
+    results = classify_files(paths, poll_interval=args.poll_interval)
+    for path in paths:
+        print(f"== {path}")
+        result = results.get(path)
+        if result is None:
+            print("Classification failed")
+            continue
+        print_result(result)
+
+
+if __name__ == "__main__":
+    main()
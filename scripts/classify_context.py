@@ -1,25 +1,107 @@
 #!/usr/bin/env python3
 """
 Classify and summarize legal documents using OpenAI LLM and Pydantic for schema validation.
+
+Usage (from the repository root, so the scripts package is importable):
+    python -m scripts.classify_context notes.txt [more.txt ...]
+    python -m scripts.classify_context --batch notes/*.txt
 """
 import argparse
+import asyncio
+import contextlib
+import contextvars
+import functools
+import hashlib
+import inspect
 import sys
+import threading
+import time
 import warnings
 import os
-from enum import Enum
-import json
-from openai import OpenAI
-from pydantic import BaseModel, Field, ValidationError, model_validator
+from collections import OrderedDict
+from pathlib import Path
+from typing import Literal
+import httpx
+import orjson
+import tiktoken
+from openai import APIConnectionError, APIError, AsyncOpenAI, InternalServerError, OpenAI, RateLimitError
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_random_exponential
+# Private SDK helper (the one chat.completions.parse uses to build its strict schema); it is
+# not part of the public API, so it is tied to the openai version pinned in requirements.txt
+from openai.lib._parsing._completions import type_to_response_format_param
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
+from pydantic_core import from_json
 from langfuse import get_client
 
+from scripts.semantic_cache import SemanticIndex
+
 api_key = os.environ.get("OPENAI_API_KEY")
-client = OpenAI(api_key=api_key)
-langfuse_client = get_client()
+
+# Seconds a fetched Langfuse prompt template is reused before it is fetched again
+PROMPT_TTL_SECONDS = 300
+
+# One pooled HTTP/2 connection per client keeps TLS handshakes off the per-call path
+HTTP_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=32)
+HTTP_TIMEOUT = httpx.Timeout(60.0, connect=5.0)
+
+# Callables invoked whenever the API answers 429, e.g. to shrink a concurrency limit
+rate_limit_listeners: list = []
+
+def _notify_rate_limited(retry_state) -> None:
+    if isinstance(retry_state.outcome.exception(), RateLimitError):
+        for listener in rate_limit_listeners:
+            listener()
+
+# Transient API failures are retried with jittered exponential backoff. The SDK's own
+# retries are disabled so the two policies do not multiply.
+retry_transient = retry(
+    retry=retry_if_exception_type((RateLimitError, APIConnectionError, InternalServerError)),
+    wait=wait_random_exponential(min=1, max=30),
+    stop=stop_after_attempt(6),
+    before_sleep=_notify_rate_limited,
+    reraise=True,
+)
+
+@functools.cache
+def openai_client() -> OpenAI:
+    """
+    Shared synchronous OpenAI client on one pooled HTTP/2 connection, created on first use.
+    """
+    http_client = httpx.Client(http2=True, limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+    return OpenAI(api_key=api_key, http_client=http_client, max_retries=0)
+
+_session_client: contextvars.ContextVar[AsyncOpenAI | None] = contextvars.ContextVar("async_client", default=None)
+
+@contextlib.asynccontextmanager
+async def async_client_session():
+    """
+    Open the pooled AsyncOpenAI client used by this module's async functions, and close it
+    together with its connections on exit. httpx async connections are bound to the loop that
+    opened them, so each asyncio.run() wraps its work in one session.
+    """
+    http_client = httpx.AsyncClient(http2=True, limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+    client = AsyncOpenAI(api_key=api_key, http_client=http_client, max_retries=0)
+    token = _session_client.set(client)
+    try:
+        yield client
+    finally:
+        _session_client.reset(token)
+        await client.close()
+
+def _async_client() -> AsyncOpenAI:
+    client = _session_client.get()
+    if client is None:
+        raise RuntimeError("Async classification must run inside async_client_session()")
+    return client
+
+@functools.cache
+def _langfuse():
+    return get_client()
 
 # Load classification definitions from JSON config
 CONFIG_PATH = os.path.join(os.path.dirname(__file__), "definitions.json")
-with open(CONFIG_PATH, 'r', encoding='utf-8') as f:
-    cfg = json.load(f)
+with open(CONFIG_PATH, 'rb') as f:
+    cfg = orjson.loads(f.read())
 
 # definitions_map is a dict mapping stringified IDs to names
 definitions_map: dict[int, str] = {
@@ -27,32 +109,83 @@ definitions_map: dict[int, str] = {
     for object_id, name in cfg.items()
 }
 
-# Dynamically generate Category enum from definitions_map (top-level categories have IDs divisible by 10000000)
-Category = Enum(
-    "Category",
-    [(name.replace(" ", "_"), name) for id, name in definitions_map.items() if id % 100000000000000000000000 == 0]
-)
+# Top-level category IDs are multiples of CATEGORY_DIVISOR; subcategory IDs add a small offset
+CATEGORY_DIVISOR = 10**23
+OTHER_CATEGORY = "other"
+# definitions.json gives "other" no subcategories of its own, so its results use this one
+OTHER_SUBCATEGORY = "Other"
 
-# Build subcategories map: group definitions_map entries by category id
-subcategories_map: dict[str, list[str]] = {}
+# Build categories and subcategories map in one pass: group definitions by parent category id
+category_names: list[str] = []
+_subcategories_by_id: dict[int, list[str]] = {}
 for id, name in definitions_map.items():
-    # Skip top-level category IDs
-    if id % 100000000000000000000000 == 0:
-        continue
-    # Compute the parent category ID by stripping lower-order digits
-    cat_id = (id // 100000000000000000000000) * 100000000000000000000000
-    parent = definitions_map.get(cat_id)
-    if parent:
-        subcategories_map.setdefault(parent, []).append(name)
-
-# Dynamically generate Subcategory enum from subcategories_map
-Subcategory = Enum(
-    "Subcategory",
-    [(sc.replace(" ", "_"), sc) for subs in subcategories_map.values() for sc in subs]
-)
+    cat_id, offset = divmod(id, CATEGORY_DIVISOR)
+    if offset == 0:
+        category_names.append(name)
+    else:
+        _subcategories_by_id.setdefault(cat_id * CATEGORY_DIVISOR, []).append(name)
+
+# Frozensets make the per-validation membership check O(1)
+subcategories_map: dict[str, frozenset[str]] = {
+    definitions_map[cat_id]: frozenset(names)
+    for cat_id, names in _subcategories_by_id.items() if cat_id in definitions_map
+}
+subcategories_map[OTHER_CATEGORY] = subcategories_map.get(OTHER_CATEGORY, frozenset()) | {OTHER_SUBCATEGORY}
+
+# Literal types validate as plain strings; a name shared by several categories appears once.
+# The category/subcategory pairing is checked after parsing (is_valid_pair), so a mismatched
+# answer still parses and can be escalated or filed under "other" instead of failing.
+_subcategory_names = tuple(dict.fromkeys([
+    *(sc for cat_id, subs in _subcategories_by_id.items() if cat_id in definitions_map for sc in subs),
+    OTHER_SUBCATEGORY,
+]))
+Category = Literal[tuple(category_names)]
+Subcategory = Literal[_subcategory_names]
 
-# Model and categories
-LANGUAGE_MODEL = 'gpt-4.1-2025-04-14'
+# Model and categories: a fast model answers first, the full model handles the hard cases
+LANGUAGE_MODEL = os.getenv("CLASSIFY_MODEL", "gpt-4.1-mini")
+FALLBACK_MODEL = os.getenv("CLASSIFY_FALLBACK_MODEL", "gpt-4.1-2025-04-14")
+# An "other" result with a summary shorter than this is treated as low confidence
+MIN_CONFIDENT_SUMMARY_CHARS = 80
+
+# Input budget for document text, measured in model tokens
+MAX_INPUT_TOKENS = 4000
+# Characters read from a TXT file; comfortably more than MAX_INPUT_TOKENS tokens of text
+TXT_READ_CHARS = 256 * 1024
+
+@functools.cache
+def _encoder() -> tiktoken.Encoding:
+    try:
+        return tiktoken.encoding_for_model(LANGUAGE_MODEL)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+def count_tokens(text: str) -> int:
+    return len(_encoder().encode(text, disallowed_special=()))
+
+def truncate_head_tail(text: str, max_tokens: int = MAX_INPUT_TOKENS) -> str:
+    """
+    Keep the first and last max_tokens/2 model tokens of text, dropping the middle.
+    The end of a document often holds signature blocks, dates and parties.
+    """
+    ids = _encoder().encode(text, disallowed_special=())
+    if len(ids) <= max_tokens:
+        return text
+    head = max_tokens // 2
+    return _encoder().decode(ids[:head]) + "\n...\n" + _encoder().decode(ids[-(max_tokens - head):])
+
+# Persistent response cache (one JSON file per input) fronted by a small in-memory LRU
+CACHE_DIR = Path(os.environ.get("R12_CACHE_DIR", Path.home() / ".cache" / "r12_classify"))
+MEMORY_CACHE_SIZE = 256
+
+# Optional second cache stage: near-duplicate inputs (e.g. re-scans, re-saves) matched by embedding
+# similarity. Off by default (R12_SEMANTIC_CACHE=1 enables it): every exact-cache miss then waits on
+# an embeddings call, and a match returns the other document's summary and themes, which for two
+# documents from one template name different parties and dates.
+SEMANTIC_CACHE = os.environ.get("R12_SEMANTIC_CACHE", "0") == "1"
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_INPUT_CHARS = 8000
+SEMANTIC_THRESHOLD = float(os.environ.get("R12_SEMANTIC_THRESHOLD", "0.97"))
 
 class ClassificationResult(BaseModel):
     """
@@ -60,114 +193,633 @@ class ClassificationResult(BaseModel):
     """
     category: Category = Field(
         ...,
-        description="One of the predefined legal-context categories",
-        example="Regulatory"
+        description="One of the predefined legal-context categories"
     )
     subcategory: Subcategory = Field(
         ...,
-        description="One of the predefined subcategories for the chosen category. Use the provided subcategory definitions to ensure the best fit.",
-        example="Inspection Report"
+        description="A subcategory belonging to the chosen category"
     )
     summary: str = Field(
         ...,
-        description="A brief summary of the document, written in 1-2 sentences. This should capture the main topic, parties, and purpose if possible."
+        description="1-2 sentence summary: main topic, parties and purpose"
     )
     key_themes: list[str] = Field(
         ...,
-        description="A list of 3 concise bullet points highlighting the most important facts, events, obligations, or issues in the document. These should serve as an extended, detailed highlight of the document—covering key events, important parties, main legal or factual points, and anything a litigator would want to quickly grasp."
+        description="3 concise points a litigator should know: key events, parties, obligations, legal or factual issues"
     )
-    @model_validator(mode="after")
-    def check_subcategory_matches_category(cls, model):
-        category_key = model.category.value if hasattr(model.category, "value") else model.category
-        allowed = subcategories_map.get(category_key, [])
-        if model.subcategory not in allowed:
-            raise ValueError(
-                f"Subcategory '{model.subcategory}' is not valid for category '{category_key}'"
-            )
-        return model
     class Config:
-        use_enum_values = True
         validate_assignment = True
 
-def classify_context(text: str) -> ClassificationResult:
+# Built once: the strict JSON schema sent as response_format, and the validator for responses
+RESPONSE_FORMAT = type_to_response_format_param(ClassificationResult)
+RESULT_ADAPTER = TypeAdapter(ClassificationResult)
+
+def parse_result(content: str | bytes) -> ClassificationResult:
     """
-    Classify and summarize the given document text using an LLM.
-    Returns a ClassificationResult object.
+    Decode a JSON response with orjson and validate the resulting dict.
+    Malformed JSON is re-parsed by pydantic so callers always see a ValidationError.
+    """
+    try:
+        data = orjson.loads(content)
+    except orjson.JSONDecodeError:
+        return RESULT_ADAPTER.validate_json(content)
+    return RESULT_ADAPTER.validate_python(data)
+
+@functools.lru_cache(maxsize=4)
+def _fetch_system_prompt(version: int | None, ttl_bucket: int) -> str:
+    return _langfuse().get_prompt("classification/main", version=version).get_langchain_prompt()
+
+def get_system_prompt(version: int | None = None) -> str:
+    """
+    Fetch the system prompt template from Langfuse by prompt name.
+    The template is reused for PROMPT_TTL_SECONDS instead of being fetched on every call.
     """
-    # Fetch the system prompt template from Langfuse by prompt name
-    prompt_template = langfuse_client.get_prompt("classification/main").get_langchain_prompt()
-    # Build messages for LLM: system prompt from Langfuse and user text
-    messages = [
+    return _fetch_system_prompt(version, int(time.monotonic() // PROMPT_TTL_SECONDS))
+
+_memory_cache: OrderedDict[str, ClassificationResult] = OrderedDict()
+# Streamlit runs each session's script in its own thread, so LRU updates must not interleave
+_memory_cache_lock = threading.Lock()
+
+@functools.lru_cache(maxsize=4)
+def _prompt_digest(prompt: str):
+    """
+    SHA-256 state after (model, system prompt), hashed once per prompt version.
+    """
+    return hashlib.sha256((LANGUAGE_MODEL + prompt).encode("utf-8"))
+
+def _cache_key(text: str) -> str:
+    digest = _prompt_digest(get_system_prompt()).copy()
+    digest.update(text.encode("utf-8"))
+    return digest.hexdigest()
+
+def _cache_get(key: str) -> ClassificationResult | None:
+    """
+    Look a result up in the in-memory LRU, then in CACHE_DIR.
+    """
+    with _memory_cache_lock:
+        if key in _memory_cache:
+            _memory_cache.move_to_end(key)
+            return _memory_cache[key]
+    try:
+        result = parse_result((CACHE_DIR / f"{key}.json").read_bytes())
+    except (OSError, ValidationError):
+        return None
+    _cache_remember(key, result)
+    return result
+
+def _cache_remember(key: str, result: ClassificationResult) -> None:
+    with _memory_cache_lock:
+        _memory_cache[key] = result
+        _memory_cache.move_to_end(key)
+        if len(_memory_cache) > MEMORY_CACHE_SIZE:
+            _memory_cache.popitem(last=False)
+
+def _cache_put(key: str, result: ClassificationResult) -> None:
+    _cache_remember(key, result)
+    path = CACHE_DIR / f"{key}.json"
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_text(result.model_dump_json(), encoding="utf-8")
+        tmp_path.replace(path)
+    except OSError as e:
+        warnings.warn(f"Failed to write classification cache entry: {e}")
+
+def cached_result(text: str) -> ClassificationResult | None:
+    """
+    Exact-cache lookup of the result for text, as done by cached_classification.
+    """
+    return _cache_get(_cache_key(text))
+
+def cache_result(text: str, result: ClassificationResult) -> None:
+    """
+    Store a result obtained outside this module (e.g. from a Batch API job) in the exact cache.
+    """
+    _cache_put(_cache_key(text), result)
+
+_semantic_index = SemanticIndex(CACHE_DIR / "semantic_index.npz")
+
+def _semantic_scope() -> str:
+    return _prompt_digest(get_system_prompt()).hexdigest()
+
+def _embed(text: str):
+    """
+    Embed the start of text for the semantic cache; None if disabled or the call fails.
+    """
+    if not SEMANTIC_CACHE:
+        return None
+    try:
+        response = openai_client().embeddings.create(model=EMBEDDING_MODEL, input=text[:EMBEDDING_INPUT_CHARS])
+    except APIError as e:
+        warnings.warn(f"Semantic cache embedding failed: {e}")
+        return None
+    return SemanticIndex.normalize(response.data[0].embedding)
+
+async def _embed_async(text: str):
+    if not SEMANTIC_CACHE:
+        return None
+    try:
+        response = await _async_client().embeddings.create(model=EMBEDDING_MODEL, input=text[:EMBEDDING_INPUT_CHARS])
+    except APIError as e:
+        warnings.warn(f"Semantic cache embedding failed: {e}")
+        return None
+    return SemanticIndex.normalize(response.data[0].embedding)
+
+def _semantic_get(key: str, vector) -> ClassificationResult | None:
+    """
+    Serve a near-duplicate's result and record it under this input's exact key.
+    """
+    if vector is None:
+        return None
+    match = _semantic_index.search(vector, _semantic_scope(), SEMANTIC_THRESHOLD)
+    result = _cache_get(match) if match else None
+    if result is not None:
+        _cache_put(key, result)
+    return result
+
+def _semantic_put(key: str, vector) -> None:
+    if vector is None:
+        return
+    try:
+        _semantic_index.add(vector, _semantic_scope(), key)
+    except OSError as e:
+        warnings.warn(f"Failed to write semantic cache index: {e}")
+
+def cached_classification(func):
+    """
+    Cache classification results keyed by a SHA-256 of (model, system prompt, text).
+    Hits are served from memory first, then from CACHE_DIR, then from a near-duplicate input
+    whose embedding has cosine similarity >= SEMANTIC_THRESHOLD; misses call func and store the result.
+    Works for both plain and async functions.
+    """
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(text: str, *args, **kwargs) -> ClassificationResult:
+            key = _cache_key(text)
+            result = _cache_get(key)
+            if result is not None:
+                return result
+            vector = await _embed_async(text)
+            result = _semantic_get(key, vector)
+            if result is None:
+                result = await func(text, *args, **kwargs)
+                _cache_put(key, result)
+                _semantic_put(key, vector)
+            return result
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(text: str, *args, **kwargs) -> ClassificationResult:
+        key = _cache_key(text)
+        result = _cache_get(key)
+        if result is not None:
+            return result
+        vector = _embed(text)
+        result = _semantic_get(key, vector)
+        if result is None:
+            result = func(text, *args, **kwargs)
+            _cache_put(key, result)
+            _semantic_put(key, vector)
+        return result
+    return wrapper
+
+def _build_messages(text: str) -> list[dict]:
+    """
+    Build messages for LLM: system prompt from Langfuse and user text cut to MAX_INPUT_TOKENS.
+    """
+    return [
         {
             "role": "system", 
-            "content": prompt_template
+            "content": get_system_prompt()
         },
         {
             "role": "user",
-            "content": text
+            "content": truncate_head_tail(text)
         },
     ]
 
-    # Make the API call to classify the text
-    resp = client.beta.chat.completions.parse(
-        model=LANGUAGE_MODEL,
+def is_valid_pair(parsed: ClassificationResult) -> bool:
+    """
+    Whether the subcategory belongs to the category.
+    """
+    return parsed.subcategory in subcategories_map.get(parsed.category, ())
+
+def _needs_fallback_model(parsed: ClassificationResult | None) -> bool:
+    """
+    Decide whether a fast-model answer should be retried with FALLBACK_MODEL.
+    """
+    if parsed is None or not is_valid_pair(parsed):
+        return True
+    return parsed.category == OTHER_CATEGORY and len(parsed.summary) < MIN_CONFIDENT_SUMMARY_CHARS
+
+def _fallback_to_other(parsed: ClassificationResult) -> ClassificationResult:
+    # A validated other/Other result, so it round-trips through the disk and semantic caches
+    return ClassificationResult(
+        category=OTHER_CATEGORY, subcategory=OTHER_SUBCATEGORY, summary=parsed.summary, key_themes=parsed.key_themes
+    )
+
+def valid_or_other(parsed: ClassificationResult) -> ClassificationResult:
+    """
+    Return parsed if its pairing is valid, otherwise its summary and themes filed under "other".
+    """
+    return parsed if is_valid_pair(parsed) else _fallback_to_other(parsed)
+
+def _feed_chunk(content: str, chunk, on_partial=None) -> str:
+    """
+    Append a streamed chunk's text to content and report the partially parsed JSON.
+    """
+    delta = chunk.choices[0].delta.content if chunk.choices else None
+    if not delta:
+        return content
+    content += delta
+    if on_partial is not None and content.lstrip():
+        on_partial(from_json(content, allow_partial="trailing-strings"))
+    return content
+
+@retry_transient
+def _stream_parse(messages: list[dict], on_partial=None, model: str = LANGUAGE_MODEL) -> ClassificationResult:
+    """
+    Stream a structured completion at temperature 0 and return the validated result.
+    Each partially parsed JSON snapshot (a dict) is passed to on_partial as tokens arrive.
+    """
+    content = ""
+    with openai_client().chat.completions.create(
+        model=model,
+        messages=messages,
+        response_format=RESPONSE_FORMAT,
+        temperature=0,
+        stream=True
+    ) as stream:
+        for chunk in stream:
+            content = _feed_chunk(content, chunk, on_partial)
+    return parse_result(content)
+
+@retry_transient
+async def _stream_parse_async(messages: list[dict], on_partial=None, model: str = LANGUAGE_MODEL) -> ClassificationResult:
+    """
+    Async counterpart of _stream_parse using the AsyncOpenAI client.
+    """
+    content = ""
+    stream = await _async_client().chat.completions.create(
+        model=model,
         messages=messages,
-        response_format=ClassificationResult
+        response_format=RESPONSE_FORMAT,
+        temperature=0,
+        stream=True
     )
+    async with stream:
+        async for chunk in stream:
+            content = _feed_chunk(content, chunk, on_partial)
+    return parse_result(content)
 
-    parsed = resp.choices[0].message.parsed
-    category_key = str(parsed.category)
-    subcategory_value = str(parsed.subcategory)
+@retry_transient
+def _parse_fallback(messages: list[dict]) -> ClassificationResult:
+    """
+    Ask FALLBACK_MODEL at temperature 0 and return the validated result.
+    The request is deterministic, so an invalid answer is not re-asked.
+    """
+    resp = openai_client().chat.completions.create(
+        model=FALLBACK_MODEL,
+        messages=messages,
+        response_format=RESPONSE_FORMAT,
+        temperature=0
+    )
+    return parse_result(resp.choices[0].message.content or "")
+
+@retry_transient
+async def _parse_fallback_async(messages: list[dict]) -> ClassificationResult:
+    resp = await _async_client().chat.completions.create(
+        model=FALLBACK_MODEL,
+        messages=messages,
+        response_format=RESPONSE_FORMAT,
+        temperature=0
+    )
+    return parse_result(resp.choices[0].message.content or "")
+
+@cached_classification
+def classify_context(text: str, on_partial=None) -> ClassificationResult:
+    """
+    Classify and summarize the given document text using an LLM.
+    LANGUAGE_MODEL answers first; invalid or low-confidence answers are retried with FALLBACK_MODEL.
+    If on_partial is given, it is called with the partially parsed response dict while streaming.
+    Returns a ClassificationResult object.
+    """
+    messages = _build_messages(text)
+
+    # Stream the first attempt so callers can show fields as they arrive
+    try:
+        parsed = _stream_parse(messages, on_partial)
+    except ValidationError:
+        parsed = None
 
     # First validation
-    if subcategory_value not in subcategories_map.get(category_key, []):
-        # Retry once
-        resp = client.beta.chat.completions.parse(
-            model=LANGUAGE_MODEL,
-            messages=messages,
-            response_format=ClassificationResult
-        )
-        parsed = resp.choices[0].message.parsed
-        category_key = str(parsed.category)
-        subcategory_value = str(parsed.subcategory)
+    if _needs_fallback_model(parsed):
+        # Retry once with the full model
+        parsed = _parse_fallback(messages)
 
         # Second validation
-        if subcategory_value not in subcategories_map.get(category_key, []):
-            # Assign "other" for both category and subcategory
-            parsed.category = Category.other
-            parsed.subcategory = Subcategory.Other
+        parsed = valid_or_other(parsed)
+
+    return parsed
+
+@cached_classification
+async def classify_context_async(text: str, on_partial=None) -> ClassificationResult:
+    """
+    Async variant of classify_context so several documents can be classified concurrently.
+    """
+    messages = _build_messages(text)
+
+    try:
+        parsed = await _stream_parse_async(messages, on_partial)
+    except ValidationError:
+        parsed = None
+
+    if _needs_fallback_model(parsed):
+        parsed = await _parse_fallback_async(messages)
+        parsed = valid_or_other(parsed)
 
     return parsed
 
+# Short documents can share one request, so the system prompt is sent once per group
+MULTI_DOC_SIZE = 5
+MULTI_DOC_MAX_TOKENS = 1000
+
+# Strict structured outputs need an object at the root, so the per-document results are wrapped
+MULTI_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "MultiClassificationResult",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "results": {"type": "array", "items": RESPONSE_FORMAT["json_schema"]["schema"]}
+            },
+            "required": ["results"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+def _build_multi_messages(texts: list[str]) -> list[dict]:
+    """
+    Build messages asking for one result per document, each delimited by a numbered sentinel.
+    """
+    docs = "\n\n".join(f"=== DOC {idx} ===\n{text}" for idx, text in enumerate(texts, 1))
+    return [
+        {
+            "role": "system",
+            "content": get_system_prompt()
+        },
+        {
+            "role": "user",
+            "content": (
+                f"Classify each of the following {len(texts)} documents independently. "
+                f"Return exactly one entry in results per document, in order.\n\n{docs}"
+            )
+        },
+    ]
+
+def _parse_multi(content: str, count: int) -> list[ClassificationResult | None]:
+    """
+    Validate each entry of a grouped response on its own. Entries that are missing, invalid
+    or would need the fallback model come back as None.
+    """
+    try:
+        items = orjson.loads(content)["results"]
+    except (orjson.JSONDecodeError, KeyError, TypeError):
+        return [None] * count
+    if not isinstance(items, list) or len(items) != count:
+        return [None] * count
+    parsed = []
+    for item in items:
+        try:
+            result = RESULT_ADAPTER.validate_python(item)
+        except ValidationError:
+            result = None
+        parsed.append(None if _needs_fallback_model(result) else result)
+    return parsed
+
+def _plan_multi(texts: list[str]) -> tuple[list, list[list[int]], list[int]]:
+    """
+    Fill cached results, then split the remaining indices into groups of short documents
+    and documents to classify on their own.
+    """
+    results: list[ClassificationResult | None] = []
+    short: list[int] = []
+    single: list[int] = []
+    for idx, text in enumerate(texts):
+        results.append(_cache_get(_cache_key(text)))
+        if results[idx] is None:
+            (short if count_tokens(text) <= MULTI_DOC_MAX_TOKENS else single).append(idx)
+    groups = [short[i:i + MULTI_DOC_SIZE] for i in range(0, len(short), MULTI_DOC_SIZE)]
+    # A group of one gains nothing over the single-document path
+    single.extend(idx for group in groups if len(group) == 1 for idx in group)
+    return results, [group for group in groups if len(group) > 1], single
+
+def _store_multi(texts: list[str], group: list[int], content: str, results: list, single: list[int]) -> None:
+    for idx, parsed in zip(group, _parse_multi(content, len(group))):
+        if parsed is None:
+            single.append(idx)
+        else:
+            results[idx] = parsed
+            _cache_put(_cache_key(texts[idx]), parsed)
+
+@retry_transient
+async def _complete_multi_async(texts: list[str]) -> str:
+    resp = await _async_client().chat.completions.create(
+        model=LANGUAGE_MODEL,
+        messages=_build_multi_messages(texts),
+        response_format=MULTI_RESPONSE_FORMAT,
+        temperature=0
+    )
+    return resp.choices[0].message.content or ""
+
+async def classify_context_multi_async(texts: list[str]) -> list[ClassificationResult | BaseException]:
+    """
+    Classify several documents, packing up to MULTI_DOC_SIZE short ones into each request.
+    Long documents, any entry a grouped answer got wrong and the members of a group whose
+    request failed go through classify_context_async; groups and single documents run concurrently.
+    Returns results in input order, with the exception in place of a document that failed.
+    """
+    results, groups, single = _plan_multi(texts)
+    contents = await asyncio.gather(*[
+        _complete_multi_async([texts[idx] for idx in group]) for group in groups
+    ], return_exceptions=True)
+    for group, content in zip(groups, contents):
+        if isinstance(content, APIError):
+            single.extend(group)
+        elif isinstance(content, BaseException):
+            for idx in group:
+                results[idx] = content
+        else:
+            _store_multi(texts, group, content, results, single)
+    # One failing document must not fail the others
+    singles = await asyncio.gather(*[classify_context_async(texts[idx]) for idx in single], return_exceptions=True)
+    for idx, result in zip(single, singles):
+        results[idx] = result
+    return results
+
+# Long documents are summarized in chunks concurrently, then the summaries are classified
+LONG_CHUNK_TOKENS = 3000
+# Chunk summaries requested at the same time for one document
+LONG_CHUNK_CONCURRENCY = 4
+# At most this many chunks are summarized (the first and last ones), so the map step stays bounded
+# and the combined summaries, a few hundred tokens each, fit in MAX_INPUT_TOKENS
+LONG_MAX_CHUNKS = 16
+CHUNK_SUMMARY_PROMPT = (
+    "You are given one part of a longer legal document. Summarize this part in 1-2 sentences "
+    "(main topic, parties and purpose) and list up to 3 points a litigator should know."
+)
+
+class ChunkSummary(BaseModel):
+    """
+    Summary of one chunk of a long document.
+    """
+    summary: str = Field(..., description="1-2 sentence summary of this part")
+    key_themes: list[str] = Field(..., description="Up to 3 points a litigator should know from this part")
+
+CHUNK_RESPONSE_FORMAT = type_to_response_format_param(ChunkSummary)
+CHUNK_ADAPTER = TypeAdapter(ChunkSummary)
+
+def _split_chunks(text: str, chunk_tokens: int) -> list[str]:
+    """
+    Split text into chunks of at most chunk_tokens tokens, on paragraph boundaries where possible.
+    """
+    chunks: list[str] = []
+    current: list[str] = []
+    current_tokens = 0
+    for paragraph in text.split("\n\n"):
+        ids = _encoder().encode(paragraph, disallowed_special=())
+        # A paragraph longer than a whole chunk is cut into token windows
+        pieces = [paragraph] if len(ids) <= chunk_tokens else [
+            _encoder().decode(ids[i:i + chunk_tokens]) for i in range(0, len(ids), chunk_tokens)
+        ]
+        for piece in pieces:
+            piece_tokens = min(len(ids), chunk_tokens)
+            if current and current_tokens + piece_tokens > chunk_tokens:
+                chunks.append("\n\n".join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += piece_tokens
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+@retry_transient
+async def _summarize_chunk_async(chunk: str) -> ChunkSummary:
+    resp = await _async_client().chat.completions.create(
+        model=LANGUAGE_MODEL,
+        messages=[
+            {"role": "system", "content": CHUNK_SUMMARY_PROMPT},
+            {"role": "user", "content": chunk},
+        ],
+        response_format=CHUNK_RESPONSE_FORMAT,
+        temperature=0
+    )
+    return CHUNK_ADAPTER.validate_python(orjson.loads(resp.choices[0].message.content or "{}"))
+
+@cached_classification
+async def classify_long(text: str, chunk_tokens: int = LONG_CHUNK_TOKENS) -> ClassificationResult:
+    """
+    Classify a document too long for one request: summarize up to LONG_MAX_CHUNKS of its chunks,
+    LONG_CHUNK_CONCURRENCY at a time (map), then classify the combined chunk summaries (reduce).
+    Each summary is cut to an equal share of MAX_INPUT_TOKENS, so none is dropped by truncation.
+    """
+    chunks = _split_chunks(text, chunk_tokens)
+    if len(chunks) == 1:
+        return await classify_context_async(text)
+    numbered = list(enumerate(chunks, 1))
+    if len(numbered) > LONG_MAX_CHUNKS:
+        # Like truncate_head_tail: the start and end of a document say the most about it
+        head = LONG_MAX_CHUNKS // 2
+        numbered = numbered[:head] + numbered[-(LONG_MAX_CHUNKS - head):]
+
+    semaphore = asyncio.Semaphore(LONG_CHUNK_CONCURRENCY)
+
+    async def summarize(chunk):
+        async with semaphore:
+            return await _summarize_chunk_async(chunk)
+
+    summaries = await asyncio.gather(*[summarize(chunk) for _, chunk in numbered])
+    # Leave room for the blank lines between parts
+    part_tokens = MAX_INPUT_TOKENS // len(summaries) - 2
+    parts = []
+    for (idx, _), part in zip(numbered, summaries):
+        ids = _encoder().encode(
+            f"Part {idx} of {len(chunks)}\nSummary: {part.summary}\nKey themes: {'; '.join(part.key_themes)}",
+            disallowed_special=()
+        )
+        parts.append(_encoder().decode(ids[:part_tokens]))
+    return await classify_context_async("\n\n".join(parts))
+
+async def warm_up_async() -> None:
+    """
+    Fetch the prompt template and open a connection to the API ahead of the first classification.
+    Failures are ignored here; the real call will surface them.
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        await asyncio.gather(
+            loop.run_in_executor(None, get_system_prompt),
+            _async_client().models.retrieve(LANGUAGE_MODEL)
+        )
+    except Exception:
+        pass
+
+def print_result(result: ClassificationResult) -> None:
+    """
+    Print a result in the command-line output format.
+    """
+    print(f"Category   : {result.category}")
+    print(f"Subcategory: {result.subcategory}")
+    print(f"Summary    : {result.summary}")
+    print("Key Themes :")
+    for idx, theme in enumerate(result.key_themes, 1):
+        print(f"  {idx}. {theme}")
+
 def main():
     """
-    Command-line interface for classifying a TXT file into a legal context and subcategory.
+    Command-line interface for classifying TXT files into a legal context and subcategory.
     """
     parser = argparse.ArgumentParser(
-        description="Classify a TXT file into a legal context and subcategory."
+        description="Classify TXT files into a legal context and subcategory."
     )
-    parser.add_argument('txt_file', help="Path to the TXT file to classify")
+    parser.add_argument('txt_files', nargs='+', help="Path(s) to the TXT file(s) to classify")
+    parser.add_argument('--batch', action='store_true', help="Submit all files as one OpenAI Batch API job (half price, up to 24h turnaround)")
     args = parser.parse_args()
 
-    # Read the input text file
-    try:
-        text = open(args.txt_file, 'r', encoding='utf-8').read()
-    except Exception as e:
-        print(f"Error reading '{args.txt_file}': {e}", file=sys.stderr)
-        sys.exit(1)
+    # Read the input text files
+    texts = []
+    for txt_file in args.txt_files:
+        try:
+            with open(txt_file, 'r', encoding='utf-8') as f:
+                texts.append(f.read())
+        except Exception as e:
+            print(f"Error reading '{txt_file}': {e}", file=sys.stderr)
+            sys.exit(1)
+
+    if args.batch:
+        from scripts.classify_batch import classify_batch
+        results = classify_batch(texts)
+        for txt_file, result in zip(args.txt_files, results):
+            if len(args.txt_files) > 1:
+                print(f"== {txt_file}")
+            if result is None:
+                print("Classification failed")
+            else:
+                print_result(result)
+        sys.exit(0 if all(results) else 1)
 
     # Classify and print results
-    try:
-        result = classify_context(text)
-        print(f"Category   : {result.category}")
-        print(f"Subcategory: {result.subcategory}")
-        print(f"Summary    : {result.summary}")
-        print("Key Themes :")
-        for idx, theme in enumerate(result.key_themes, 1):
-            print(f"  {idx}. {theme}")
-    except ValidationError as e:
-        warnings.warn(f"Failed to validate LLM response: {e}")
-        sys.exit(1)
+    for txt_file, text in zip(args.txt_files, texts):
+        if len(args.txt_files) > 1:
+            print(f"== {txt_file}")
+        try:
+            print_result(classify_context(text))
+        except ValidationError as e:
+            warnings.warn(f"Failed to validate LLM response: {e}")
+            sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
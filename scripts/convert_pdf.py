@@ -1,25 +1,130 @@
 import fitz
 import os
+import re
+import warnings
+from collections import Counter
+
+# A line repeated at the same place on at least this share of pages (and on at least
+# BOILERPLATE_MIN_PAGES pages) is treated as a running header/footer
+BOILERPLATE_PAGE_SHARE = 0.6
+BOILERPLATE_MIN_PAGES = 3
+# Only this many non-blank lines at the top and bottom of each page are candidates
+BOILERPLATE_EDGE_LINES = 3
+# If stripping would remove more than this share of the text, it was not boilerplate
+BOILERPLATE_MAX_REMOVED = 0.5
+# "Page 3", "Page 3 of 12", "3 / 12", "- 3 -": the number changes from page to page
+_PAGE_NUMBER = re.compile(
+    r"\bpage\s+\d+(?:\s*(?:of|/)\s*\d+)?\b|^\W*\d+(?:\s*(?:of|/)\s*\d+)?\W*$", re.IGNORECASE
+)
+
+def _edge_keys(lines):
+    """
+    Map the index of each edge line of a page to its keys: (position from top or bottom, text).
+    Page numbers are normalized so numbered footers compare equal.
+    """
+    filled = [idx for idx, line in enumerate(lines) if line.strip()]
+    keys = {}
+    for pos, idx in enumerate(filled[:BOILERPLATE_EDGE_LINES]):
+        keys.setdefault(idx, []).append((pos, _PAGE_NUMBER.sub("#", lines[idx].strip())))
+    for pos, idx in enumerate(filled[-BOILERPLATE_EDGE_LINES:][::-1]):
+        keys.setdefault(idx, []).append((-1 - pos, _PAGE_NUMBER.sub("#", lines[idx].strip())))
+    return keys
+
+def strip_boilerplate(pages):
+    """
+    Join page texts, dropping repeated running headers and footers (letterheads, confidentiality
+    notices, "Page 3 of 12"): lines at the top or bottom of a page that recur at the same place on
+    most pages. The first copy is kept, since a header such as a deposition caption is still a signal.
+    """
+    joined = "\n\n".join(pages)
+    if len(pages) < BOILERPLATE_MIN_PAGES:
+        return joined
+    page_lines = [page.splitlines() for page in pages]
+    page_keys = [_edge_keys(lines) for lines in page_lines]
+    counts = Counter(key for keys in page_keys for key in {k for ks in keys.values() for k in ks})
+    min_count = max(BOILERPLATE_MIN_PAGES, BOILERPLATE_PAGE_SHARE * len(pages))
+    seen = set()
+    kept_pages = []
+    for lines, keys in zip(page_lines, page_keys):
+        kept = []
+        for idx, line in enumerate(lines):
+            repeated = [key for key in keys.get(idx, ()) if counts[key] >= min_count]
+            if repeated and seen.intersection(repeated):
+                continue
+            seen.update(repeated)
+            kept.append(line)
+        kept_pages.append("\n".join(kept))
+    stripped = "\n\n".join(kept_pages)
+    if len("".join(stripped.split())) < (1 - BOILERPLATE_MAX_REMOVED) * len("".join(joined.split())):
+        return joined
+    return stripped
 
 def pdf_to_text(pdf_bytes, num_pages=5):
     """
-    Convert the first num_pages of a PDF (from bytes) to text.
+    Convert the first num_pages of a PDF (from bytes) to text, without repeated headers/footers.
     Returns the extracted text as a string.
     """
     with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
-        pages_to_use = doc[:num_pages]
-        text = "\n\n".join(page.get_text() for page in pages_to_use)
-    return text
+        pages = [doc[i].get_text("text") for i in range(min(num_pages, len(doc)))]
+    return strip_boilerplate(pages)
+
+class NeedsOCRError(Exception):
+    """
+    Raised when a PDF has too little extractable text and should be OCR'd instead.
+    """
+
+
+def pdf_to_text_with_stats(pdf_bytes, num_pages=5, min_words=20, probe_pages=3):
+    """
+    Convert the first num_pages of a PDF (from bytes) to text, counting words as pages are parsed.
+    Returns (text, word_count); repeated headers/footers are removed from the text but still counted.
+    Raises NeedsOCRError as soon as the first probe_pages pages (or the whole document, if shorter)
+    yield fewer than min_words words.
+    """
+    texts = []
+    word_count = 0
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        for page_idx in range(1, min(num_pages, len(doc)) + 1):
+            page_text = doc[page_idx - 1].get_text("text")
+            texts.append(page_text)
+            word_count += len(page_text.split())
+            if page_idx == probe_pages and word_count < min_words:
+                raise NeedsOCRError(f"Only {word_count} words in the first {probe_pages} pages")
+    if word_count < min_words:
+        raise NeedsOCRError(f"Only {word_count} words of extractable text")
+    return strip_boilerplate(texts), word_count
 
 def extract_first_n_pages(pdf_bytes, n=10):
     """
     Return a bytes object containing a new PDF with the first n pages.
+    PDFs that already have n pages or fewer are returned unchanged.
     """
     with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        if len(doc) <= n:
+            return pdf_bytes
         new_pdf = fitz.open()
-        for i in range(min(n, len(doc))):
-            new_pdf.insert_pdf(doc, from_page=i, to_page=i)
+        new_pdf.insert_pdf(doc, from_page=0, to_page=n - 1)
         return new_pdf.tobytes()
 
 
-    
\ No newline at end of file
+    
+
+def pdf_to_text_or_ocr(pdf_bytes, num_pages=5):
+    """
+    Text of the first num_pages of a PDF, OCR'd when it has almost no text layer (see
+    pdf_to_text_with_stats). Without PaddleOCR installed, the extracted text is used as is.
+    Returns (text, word_count).
+    """
+    try:
+        return pdf_to_text_with_stats(pdf_bytes, num_pages=num_pages)
+    except NeedsOCRError:
+        pass
+    try:
+        from scripts.ocr import ocr_pdf_to_text
+    except ImportError as e:
+        warnings.warn(f"OCR unavailable ({e}); using the extracted PDF text")
+        text = pdf_to_text(pdf_bytes, num_pages=num_pages)
+    else:
+        # OCR rasterizes every page, so trim to the first num_pages first
+        text = ocr_pdf_to_text(extract_first_n_pages(pdf_bytes, n=num_pages))
+    return text, len(text.split())
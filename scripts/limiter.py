@@ -0,0 +1,77 @@
+"""
+Adaptive concurrency limiting for API-bound asyncio work.
+"""
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Optional
+
+
+class AdaptiveLimiter:
+    """
+    Concurrency limit that adapts AIMD-style: halved when the API rate-limits us (at most once
+    per round trip, since concurrent requests all see the same 429 burst), raised by one after
+    each full window of successful calls.
+    When a requests-per-minute budget is known, the limit is also capped by Little's law
+    (concurrency = request rate x mean latency) over a rolling window of call latencies.
+    """
+
+    def __init__(self, initial: int = 8, maximum: int = 32, rpm: Optional[int] = None, window: int = 50):
+        self.maximum = maximum
+        self.limit = max(1, min(initial, maximum))
+        self.rpm = rpm
+        self.latencies: deque[float] = deque(maxlen=window)
+        self.in_flight = 0
+        self.successes = 0
+        self._last_decrease: Optional[float] = None
+        self._cond = asyncio.Condition()
+
+    def ceiling(self) -> int:
+        """
+        Upper bound on the limit implied by the RPM budget and observed latency.
+        """
+        if not self.rpm or not self.latencies:
+            return self.maximum
+        return max(1, min(self.maximum, int(self.rpm / 60 * self.mean_latency())))
+
+    def mean_latency(self) -> Optional[float]:
+        return sum(self.latencies) / len(self.latencies) if self.latencies else None
+
+    def rate_limited(self) -> None:
+        """
+        Multiplicative decrease after a 429 response. Further 429s within one mean call latency
+        (at least a second) come from requests sent before the decrease and are ignored.
+        """
+        now = time.monotonic()
+        hold = max(1.0, self.mean_latency() or 0.0)
+        if self._last_decrease is not None and now - self._last_decrease < hold:
+            return
+        self._last_decrease = now
+        self.limit = max(1, self.limit // 2)
+        self.successes = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        """
+        Hold one unit of concurrency for the duration of the block.
+        """
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < min(self.limit, self.ceiling()))
+            self.in_flight += 1
+        start = time.monotonic()
+        succeeded = False
+        try:
+            yield
+            succeeded = True
+        finally:
+            async with self._cond:
+                self.in_flight -= 1
+                if succeeded:
+                    self.latencies.append(time.monotonic() - start)
+                    self.successes += 1
+                    # Additive increase once a full window at the current limit has succeeded
+                    if self.successes >= self.limit:
+                        self.successes = 0
+                        self.limit = min(self.limit + 1, self.ceiling())
+                self._cond.notify_all()
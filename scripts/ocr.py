@@ -5,114 +5,78 @@ PDF -> text via PaddleOCR, returning the result as a string (no output file by d
 Usage:
     python ocr_pdf_to_text_cleanup_return.py my.pdf  # prints the text
     python ocr_pdf_to_text_cleanup_return.py my.pdf -o output.txt  # also writes to file
-    python ocr_pdf_to_text_cleanup_return.py my.pdf --keep-intermediate  # keeps temps
 """
 
-import os
-import glob
-import json
-import shutil
-from typing import List, Tuple, Optional
+import functools
+from typing import List, Optional, Union
 
-from pdf2image import convert_from_path
+import fitz
+import numpy as np
 from paddleocr import PaddleOCR
 
+# Pages sent to PaddleOCR per predict() call; bounds memory on long documents
+OCR_BATCH_SIZE = 8
 
-def pdf_to_images(pdf_path: str, dpi: int = 100) -> Tuple[List[str], str]:
-    """
-    Convert a PDF file to images (one per page).
-    Returns a list of image file paths and the output folder.
-    """
-    base, _ = os.path.splitext(pdf_path)
-    output_folder = f"{base}_pages"
-    os.makedirs(output_folder, exist_ok=True)
-
-    pages = convert_from_path(pdf_path, dpi=dpi)
-    image_paths: List[str] = []
-    for i, page in enumerate(pages, start=1):
-        img_path = os.path.join(output_folder, f"page_{i:03d}.png")
-        page.save(img_path, "PNG")
-        image_paths.append(img_path)
-    return image_paths, output_folder
-
-
-def ocr_images(
-    image_paths: List[str],
-    ocr: PaddleOCR,
-    img_out_folder: str,
-    json_out_folder: str,
-) -> None:
+
+@functools.cache
+def _get_ocr() -> PaddleOCR:
     """
-    Run OCR on a list of images, saving region images and JSON results.
+    PaddleOCR pipeline, loaded once per process and reused across documents.
     """
-    os.makedirs(img_out_folder, exist_ok=True)
-    os.makedirs(json_out_folder, exist_ok=True)
-
-    for page_idx, img_path in enumerate(image_paths, start=1):
-        results = ocr.predict(img_path)
-        for res_idx, res in enumerate(results, start=1):
-            res.print()
-            out_img = os.path.join(img_out_folder, f"page{page_idx:03d}_reg{res_idx:02d}.png")
-            res.save_to_img(out_img)
-            out_json = os.path.join(json_out_folder, f"page{page_idx:03d}_reg{res_idx:02d}.json")
-            res.save_to_json(out_json)
+    return PaddleOCR(
+        use_doc_orientation_classify=False,
+        use_doc_unwarping=False,
+        use_textline_orientation=False,
+        lang="en",
+    )
 
 
-def collate_rec_texts_to_string(json_folder: str) -> str:
+def pdf_to_images(pdf: Union[str, bytes], dpi: int = 100) -> List[np.ndarray]:
+    """
+    Rasterize a PDF (file path or raw bytes) in memory, one BGR image array per page.
+    """
+    doc = fitz.open(pdf) if isinstance(pdf, str) else fitz.open(stream=pdf, filetype="pdf")
+    images: List[np.ndarray] = []
+    with doc:
+        for page in doc:
+            pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csRGB, alpha=False)
+            rgb = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+            # PaddleOCR follows the OpenCV channel order
+            images.append(np.ascontiguousarray(rgb[:, :, ::-1]))
+    return images
+
+
+def ocr_images(images: List[np.ndarray], ocr: PaddleOCR) -> List[str]:
     """
-    Extract all recognized texts from JSON files and return as a single string.
+    Run OCR on a list of page images and return the recognized text lines in page order.
+    Pages are predicted in batches of OCR_BATCH_SIZE.
     """
-    all_texts: List[str] = []
-    for js_file in sorted(glob.glob(os.path.join(json_folder, "*.json"))):
-        with open(js_file, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            texts = data.get("rec_texts", [])
-            all_texts.extend(texts)
-    return "\n".join(all_texts)
+    texts: List[str] = []
+    for start in range(0, len(images), OCR_BATCH_SIZE):
+        for res in ocr.predict(images[start:start + OCR_BATCH_SIZE]):
+            texts.extend(res.get("rec_texts", []))
+    return texts
 
 
 def ocr_pdf_to_text(
-    pdf_path: str,
+    pdf: Union[str, bytes],
     output_txt: Optional[str] = None,
     dpi: int = 100,
-    cleanup: bool = True,
 ) -> str:
     """
     Convert PDF to text via OCR.
-    - pdf_path: Path to PDF file.
+    - pdf: Path to PDF file, or the PDF bytes already in memory.
     - output_txt: Optional path to save the extracted text.
     - dpi: Resolution for image conversion (higher = better OCR, slower).
-    - cleanup: Whether to remove intermediate files/folders.
     Returns the extracted text as a string.
     """
-    image_paths, img_folder = pdf_to_images(pdf_path, dpi=dpi)
-
-    ocr = PaddleOCR(
-        use_doc_orientation_classify=False,
-        use_doc_unwarping=False,
-        use_textline_orientation=False,
-        lang="en",
-    )
-
-    # Prepare output folders
-    out_dir = os.path.dirname(os.path.abspath(output_txt)) if output_txt else os.getcwd()
-    img_out = os.path.join(out_dir, "ocr_images")
-    json_out = os.path.join(out_dir, "ocr_json")
-    ocr_images(image_paths, ocr, img_out, json_out)
-
-    # Collate recognized text
-    text = collate_rec_texts_to_string(json_out)
+    images = pdf_to_images(pdf, dpi=dpi)
+    text = "\n".join(ocr_images(images, _get_ocr()))
     if output_txt:
         with open(output_txt, "w", encoding="utf-8") as out:
             out.write(text)
         print(f"Wrote {len(text.splitlines())} lines into {output_txt}")
 
-    # Clean up intermediate files if requested
-    if cleanup:
-        for folder in (img_folder, img_out, json_out):
-            shutil.rmtree(folder, ignore_errors=True)
-        print("Removed intermediate folders and files.")
-
     return text
 
 
@@ -120,7 +84,7 @@ if __name__ == "__main__":
     import argparse
 
     parser = argparse.ArgumentParser(
-        description="PDF → PNGs → PaddleOCR.predict() → text string (with optional file output and cleanup)"
+        description="PDF → page images → PaddleOCR.predict() → text string (with optional file output)"
     )
     parser.add_argument("pdf_path", help="Path to the PDF file")
     parser.add_argument(
@@ -133,12 +97,7 @@ if __name__ == "__main__":
         "--dpi",
         type=int,
         default=100,
-        help="DPI for PDF→image conversion (higher = slower & larger files)",
-    )
-    parser.add_argument(
-        "--keep-intermediate",
-        action="store_true",
-        help="Preserve intermediate image, crop, and JSON files",
+        help="DPI for PDF→image conversion (higher = better OCR, slower)",
     )
 
     args = parser.parse_args()
@@ -146,6 +105,5 @@ if __name__ == "__main__":
         args.pdf_path,
         output_txt=args.output,
         dpi=args.dpi,
-        cleanup=not args.keep_intermediate,
     )
     # print(result_text)
\ No newline at end of file
@@ -0,0 +1,78 @@
+"""
+Embedding index used to recognise near-duplicate documents (same contract, different scan).
+"""
+import os
+import threading
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+
+class SemanticIndex:
+    """
+    Exhaustive inner-product index over unit-normalised embeddings, persisted as one .npz file.
+    Each row maps to an exact-cache key and a scope (model + prompt), and lookups only match
+    rows from the same scope.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.ndarray] = None
+        self._keys: list[str] = []
+        self._scopes: list[str] = []
+
+    def _load(self) -> None:
+        if self._vectors is not None:
+            return
+        try:
+            with np.load(self.path) as data:
+                self._vectors = data["vectors"].astype(np.float32)
+                self._keys = data["keys"].tolist()
+                self._scopes = data["scopes"].tolist()
+        except (OSError, KeyError, ValueError):
+            self._vectors = np.zeros((0, 0), dtype=np.float32)
+            self._keys, self._scopes = [], []
+
+    @staticmethod
+    def normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def search(self, vector: np.ndarray, scope: str, threshold: float) -> Optional[str]:
+        """
+        Return the key of the most similar entry in scope if its cosine similarity >= threshold.
+        """
+        with self._lock:
+            self._load()
+            if not self._keys or self._vectors.shape[1] != vector.shape[0]:
+                return None
+            in_scope = np.array([s == scope for s in self._scopes])
+            if not in_scope.any():
+                return None
+            scores = np.where(in_scope, self._vectors @ vector, -1.0)
+            best = int(np.argmax(scores))
+            return self._keys[best] if scores[best] >= threshold else None
+
+    def add(self, vector: np.ndarray, scope: str, key: str) -> None:
+        """
+        Add an entry and persist the index atomically.
+        """
+        with self._lock:
+            self._load()
+            if self._keys and self._vectors.shape[1] != vector.shape[0]:
+                # Embedding model changed; start a fresh index
+                self._vectors = np.zeros((0, 0), dtype=np.float32)
+                self._keys, self._scopes = [], []
+            rows = self._vectors if self._keys else np.zeros((0, vector.shape[0]), dtype=np.float32)
+            self._vectors = np.vstack([rows, vector[None, :]])
+            self._keys.append(key)
+            self._scopes.append(scope)
+
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(tmp_path, "wb") as f:
+                np.savez(f, vectors=self._vectors, keys=np.array(self._keys), scopes=np.array(self._scopes))
+            tmp_path.replace(self.path)
@@ -1,40 +1,172 @@
 import streamlit as st
+import asyncio
+import hashlib
 import os
 import time
-import json
-import pandas as pd
-import io
-import zipfile
-import tempfile
-from scripts.classify_context import classify_context
-from scripts.convert_pdf import pdf_to_text, extract_first_n_pages
-
-# --- Load definitions for categories and subcategories ---
-script_dir = os.path.dirname(__file__)
-definitions_path = os.path.join(script_dir, "scripts", "definitions.json")
-with open(definitions_path, "r") as f:
-    definitions_data = json.load(f)
+import orjson
+from scripts.classify_batch import poll_batch, start_batch
+from scripts.classify_context import (
+    MAX_INPUT_TOKENS, MULTI_DOC_SIZE, TXT_READ_CHARS, OTHER_CATEGORY, OTHER_SUBCATEGORY, async_client_session, cached_result,
+    classify_context_multi_async, classify_long, count_tokens
+)
+from scripts.convert_pdf import pdf_to_text
 
 CATEGORY_DIVISOR = 100000000000000000000000
-definitions_map = {int(k): v for k, v in definitions_data.items()}
 
-# Categories: IDs divisible by CATEGORY_DIVISOR
-categories_list = [v for k, v in definitions_map.items() if k % CATEGORY_DIVISOR == 0]
+@st.cache_resource
+def load_definitions():
+    """
+    Load categories and subcategories from definitions.json once per server process,
+    shared by every session and rerun.
+    Returns (categories, subcategories_data) where categories is a tuple of names and
+    subcategories_data maps each category name to a tuple of its subcategory names.
+    """
+    definitions_path = os.path.join(os.path.dirname(__file__), "scripts", "definitions.json")
+    with open(definitions_path, "rb") as f:
+        definitions_data = orjson.loads(f.read())
+    definitions_map = {int(k): v for k, v in definitions_data.items()}
 
-# Subcategories: group by parent category name
-subcategories_data = {}
-for k, v in definitions_map.items():
-    if k % CATEGORY_DIVISOR == 0:
-        continue
-    parent_id = (k // CATEGORY_DIVISOR) * CATEGORY_DIVISOR
-    parent_name = definitions_map.get(parent_id)
-    if parent_name:
-        subcategories_data.setdefault(parent_name, []).append(v)
+    # Categories: IDs divisible by CATEGORY_DIVISOR
+    categories = tuple(v for k, v in definitions_map.items() if k % CATEGORY_DIVISOR == 0)
+
+    # Subcategories: group by parent category name
+    subcategories_data = {}
+    for k, v in definitions_map.items():
+        if k % CATEGORY_DIVISOR == 0:
+            continue
+        parent_id = (k // CATEGORY_DIVISOR) * CATEGORY_DIVISOR
+        parent_name = definitions_map.get(parent_id)
+        if parent_name:
+            subcategories_data.setdefault(parent_name, []).append(v)
+    # Same pairing the classifier accepts for documents filed under "other"
+    subcategories_data.setdefault(OTHER_CATEGORY, [OTHER_SUBCATEGORY])
+    # Tuples, so every rerun passes the same immutable options to the selectboxes
+    return categories, {cat: tuple(subs) for cat, subs in subcategories_data.items()}
+
+# Maximum number of document groups (of up to MULTI_DOC_SIZE) classified at the same time
+MAX_CONCURRENT_CLASSIFICATIONS = 10
+# Uploads with at least this many new documents can be sent through the Batch API instead
+BATCH_UPLOAD_THRESHOLD = 20
+# Labels for st.feedback("thumbs") values (0 = down, 1 = up)
+SENTIMENT_EMOJI = (":material/thumb_down:", ":material/thumb_up:")
+# Selectbox options for a category without subcategories
+NO_OPTIONS = ()
+
+@st.cache_data(persist="disk", show_spinner=False, max_entries=256)
+def extract_pdf_text(content_hash: str, _pdf_buffer: memoryview) -> str:
+    """
+    Text of the first 5 pages, cached by content_hash across reruns, sessions and restarts.
+    The buffer itself is excluded from Streamlit's argument hashing.
+    """
+    return pdf_to_text(_pdf_buffer, num_pages=5)
+
+def split_name(file_name: str) -> tuple[str, str]:
+    """
+    Split an upload's file name into (base name, lowercased extension).
+    Upload names carry no directory, so a single rfind is enough; a leading dot is not an extension.
+    """
+    dot = file_name.rfind(".")
+    if dot <= 0:
+        return file_name, ""
+    return file_name[:dot], file_name[dot:].lower()
+
+def process_file(uploaded_file, content_hash: str) -> str | None:
+    """
+    Extract the text to classify from one uploaded file; None for unsupported file types.
+    """
+    _, file_ext = split_name(uploaded_file.name)
+    # Work on the upload's own buffer rather than a bytes copy of it
+    if file_ext == ".pdf":
+        return extract_pdf_text(content_hash, uploaded_file.getbuffer())
+    if file_ext == ".txt":
+        # Bounded like the CLI, so a huge transcript cannot fan out into hundreds of chunk requests
+        return str(uploaded_file.getbuffer()[:TXT_READ_CHARS], "utf-8", errors="ignore")
+    return None
+
+@st.cache_resource
+def batch_jobs() -> dict:
+    """
+    Running Batch API jobs as {document keys: (batch ID, submit time)}, shared by all sessions
+    so a rerun or a reopened tab picks up a job instead of submitting (and paying for) it again.
+    """
+    return {}
+
+def classify_with_batch(keys, texts):
+    """
+    Classify texts through the Batch API without blocking the script run: the job is submitted
+    once and then checked on each rerun. Documents already in the classification cache are not sent.
+    Returns (results or exceptions in input order, submit time), or (None, submit time) while
+    the job is still running.
+    """
+    results = [cached_result(text) for text in texts]
+    missing = [idx for idx, result in enumerate(results) if result is None]
+    if not missing:
+        return results, time.time()
+    job_key = tuple(keys[idx] for idx in missing)
+    missing_texts = [texts[idx] for idx in missing]
+    jobs = batch_jobs()
+    try:
+        if job_key not in jobs:
+            jobs[job_key] = (start_batch(missing_texts), time.time())
+        batch_id, submitted = jobs[job_key]
+        batch_results = poll_batch(batch_id, missing_texts)
+    except Exception as e:
+        # Failed, expired or cancelled job, or an API error: report it and allow a new submission
+        submitted = jobs.pop(job_key, (None, time.time()))[1]
+        batch_results = [e] * len(missing)
+    if batch_results is None:
+        return None, submitted
+    jobs.pop(job_key, None)
+    for idx, result in zip(missing, batch_results):
+        results[idx] = result if result is not None else RuntimeError("Batch request failed")
+    return results, submitted
+
+async def classify_all(texts, on_done=None):
+    """
+    Classify several texts concurrently, returning results (or exceptions) in input order.
+    Texts longer than MAX_INPUT_TOKENS are classified chunk-wise with classify_long; the rest
+    are sent in groups so short documents can share one request.
+    on_done, if given, is called with each text's index once its group finishes.
+    """
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_CLASSIFICATIONS)
+    long_flags = [count_tokens(text) > MAX_INPUT_TOKENS for text in texts]
+    rest = [idx for idx, is_long in enumerate(long_flags) if not is_long]
+    groups = [[idx] for idx, is_long in enumerate(long_flags) if is_long]
+    groups += [rest[i:i + MULTI_DOC_SIZE] for i in range(0, len(rest), MULTI_DOC_SIZE)]
+
+    async def classify_group(group):
+        async with semaphore:
+            try:
+                if long_flags[group[0]]:
+                    return [await classify_long(texts[group[0]])]
+                return await classify_context_multi_async([texts[idx] for idx in group])
+            finally:
+                if on_done:
+                    for idx in group:
+                        on_done(idx)
+
+    # One client per run; it is closed with its connections when the run's event loop is done
+    async with async_client_session():
+        grouped = await asyncio.gather(*[classify_group(group) for group in groups], return_exceptions=True)
+    results = [None] * len(texts)
+    for group, group_results in zip(groups, grouped):
+        if isinstance(group_results, BaseException):
+            group_results = [group_results] * len(group)
+        for idx, result in zip(group, group_results):
+            results[idx] = result
+    return results
 
 def main():
+    categories_list, subcategories_data = load_definitions()
+
     st.title('Fileread Document Classification')
     st.write('Upload one or more PDF files to classify their legal context and subcategory.')
 
+    use_batch_api = st.checkbox(
+        f"Use the OpenAI Batch API when {BATCH_UPLOAD_THRESHOLD} or more new documents are uploaded "
+        "(half price, may take up to 24 hours)"
+    )
+
     uploaded_files = st.file_uploader(
         "Choose PDF files", 
         type=["pdf", "txt"], 
@@ -42,53 +174,102 @@ def main():
     )
 
     if uploaded_files:
+        # Extract text for new files, then classify all of them concurrently
+        start_times = {}
+        state_keys = {}
+        pending = []
+        errors = {}
+        waiting = set()
+        for uploaded_file in uploaded_files:
+            file_key = uploaded_file.name
+            # Results are kept per file content: a changed file under the same name is classified
+            # again, while the same document under another name reuses its result
+            # BLAKE2b is faster than SHA-256 and 128 bits is plenty for a cache key
+            content_hash = hashlib.blake2b(uploaded_file.getbuffer(), digest_size=16).hexdigest()
+            state_key = state_keys[file_key] = f"doc_{content_hash}"
+            if state_key in st.session_state or any(key == state_key for key, _, _ in pending):
+                continue
+
+            start_times[state_key] = time.time()
+            with st.spinner(f'Extracting text from {file_key}'):
+                text_content = process_file(uploaded_file, content_hash)
+            if text_content is not None:
+                pending.append((state_key, file_key, text_content))
+
+        if pending:
+            texts = [text for _, _, text in pending]
+            # Completion time of each pending document; a batch job finishes them all at once
+            finished = {}
+            if use_batch_api and len(pending) >= BATCH_UPLOAD_THRESHOLD:
+                keys = [state_key for state_key, _, _ in pending]
+                with st.spinner(f'Checking batch job with {len(pending)} document(s)...'):
+                    results, submitted = classify_with_batch(keys, texts)
+                for state_key in keys:
+                    start_times[state_key] = submitted
+                if results is None:
+                    waiting.update(keys)
+                    results = []
+                    st.info(
+                        f"Batch job with {len(pending)} document(s) is running; it may take up to 24 hours. "
+                        "Results are saved when it finishes, so this page can be closed and reopened."
+                    )
+                    st.button("Check batch status")
+            else:
+                progress = st.progress(0.0, text=f'Analyzing {len(pending)} document(s)...')
+
+                def advance(idx):
+                    finished[idx] = time.time()
+                    done = len(finished)
+                    progress.progress(done / len(pending), text=f'Analyzed {done} of {len(pending)} document(s)')
+
+                results = asyncio.run(classify_all(texts, on_done=advance))
+                progress.empty()
+            end_time = time.time()
+            for idx, ((state_key, _, text_content), result) in enumerate(zip(pending, results)):
+                if isinstance(result, Exception):
+                    errors[state_key] = result
+                else:
+                    # Elapsed time is measured once, when the document is classified, so reruns
+                    # keep reporting it instead of the time spent re-rendering
+                    st.session_state[state_key] = {
+                        "text": text_content,
+                        "result": result,
+                        "elapsed": finished.get(idx, end_time) - start_times[state_key],
+                    }
+
         for uploaded_file in uploaded_files:
             file_key = uploaded_file.name
 
             st.subheader(f"{file_key}")
-            start_time = time.time()
-
-            if file_key not in st.session_state:
-                file_ext = os.path.splitext(file_key)[1].lower()
-                if file_ext == ".pdf":
-                    pdf_bytes = uploaded_file.read()
-                    first5_pdf_bytes = extract_first_n_pages(pdf_bytes, n=5)
-                    with st.spinner('Extracting text'):
-                        text_content = pdf_to_text(first5_pdf_bytes, num_pages=5)
-                elif file_ext == ".txt":
-                    text_content = uploaded_file.read().decode("utf-8", errors="ignore")
+
+            state_key = state_keys[file_key]
+            if state_key not in st.session_state:
+                if state_key in errors:
+                    st.error(f"Error analyzing {file_key}: {errors[state_key]}")
+                elif state_key in waiting:
+                    st.info(f"Waiting for the batch job to classify {file_key}")
                 else:
                     st.warning(f"Unsupported file type: {file_key}")
-                    continue
+                continue
 
-                try:
-                    with st.spinner('Analyzing document...'):
-                        result = classify_context(text_content)
-                    st.session_state[file_key] = {
-                        "text": text_content,
-                        "result": result
-                    }
-                except Exception as e:
-                    st.error(f"Error analyzing {file_key}: {e}")
-                    continue
-            else:
-                text_content = st.session_state[file_key]["text"]
-                result = st.session_state[file_key]["result"]
+            text_content = st.session_state[state_key]["text"]
+            result = st.session_state[state_key]["result"]
+            # Formatted once per file; every widget click reruns this loop for all files
+            predicted_category = str(result.category)
+            predicted_subcategory = str(result.subcategory)
 
-            st.text_area("Preview", text_content[:200], height=100, disabled=True)
+            st.text_area("Preview", text_content[:200], height=100, disabled=True, key=f"preview_{uploaded_file.name}")
 
             col1, col2 = st.columns(2)
-            col1.metric(label="Category", value=str(result.category))
-            col2.metric(label="Subcategory", value=getattr(result.subcategory, "value", str(result.subcategory)))
-
-            sentiment_mapping = [":material/thumb_down:", ":material/thumb_up:"]
+            col1.metric(label="Category", value=predicted_category)
+            col2.metric(label="Subcategory", value=predicted_subcategory)
 
             col1, col2 = st.columns(2)
             with col1:
                 cat_feedback = st.feedback("thumbs", key=f"cat_{uploaded_file.name}")
                 if cat_feedback is not None:
                     if cat_feedback == 1:
-                        category_value = str(result.category)
+                        category_value = predicted_category
                     else:
                         category_value = st.selectbox(
                             "Please select the correct category",
@@ -99,8 +280,8 @@ def main():
             with col2:
                 if 'cat_feedback' in locals() and cat_feedback == 0:
                     subcat_feedback = 0
-                    current_cat = category_value if 'category_value' in locals() else str(result.category)
-                    options = subcategories_data.get(current_cat, [])
+                    current_cat = category_value if 'category_value' in locals() else predicted_category
+                    options = subcategories_data.get(current_cat, NO_OPTIONS)
                     subcategory_value = st.selectbox(
                         "Please select the correct subcategory",
                         options,
@@ -111,10 +292,10 @@ def main():
                     subcat_feedback = st.feedback("thumbs", key=f"subcat_{uploaded_file.name}")
                     if subcat_feedback is not None:
                         if subcat_feedback == 1:
-                            subcategory_value = getattr(result.subcategory, "value", str(result.subcategory))
+                            subcategory_value = predicted_subcategory
                         else:
-                            current_cat = category_value if 'category_value' in locals() else str(result.category)
-                            options = subcategories_data.get(current_cat, [])
+                            current_cat = category_value if 'category_value' in locals() else predicted_category
+                            options = subcategories_data.get(current_cat, NO_OPTIONS)
                             subcategory_value = st.selectbox(
                                 "Please select the correct subcategory",
                                 options,
@@ -126,20 +307,22 @@ def main():
             st.info(result.summary)
             selected_sum = st.feedback("thumbs", key=f"sum_{uploaded_file.name}")
             if selected_sum is not None:
-                st.markdown(f"You selected: {sentiment_mapping[selected_sum]} for Summary")
+                st.markdown(f"You selected: {SENTIMENT_EMOJI[selected_sum]} for Summary")
 
             st.markdown("**Key Themes:**")
             for theme in result.key_themes:
                 st.markdown(f"- {theme}")
             selected_themes = st.feedback("thumbs", key=f"themes_{uploaded_file.name}")
             if selected_themes is not None:
-                st.markdown(f"You selected: {sentiment_mapping[selected_themes]} for Key Themes")
+                st.markdown(f"You selected: {SENTIMENT_EMOJI[selected_themes]} for Key Themes")
 
+            # The full text is only sent to the browser once asked for; a collapsed expander
+            # would still carry it on every rerun
             with st.expander("View Full Document"):
-                st.text_area("Document Text", text_content, height=300, disabled=True)
+                if st.toggle("Show document text", key=f"show_text_{uploaded_file.name}"):
+                    st.text_area("Document Text", text_content, height=300, disabled=True, key=f"text_{uploaded_file.name}")
 
-            end_time = time.time()
-            st.info(f"Time taken to process: {end_time - start_time:.2f} seconds")
+            st.info(f"Time taken to process: {st.session_state[state_key]['elapsed']:.2f} seconds")
 
             if (
                 ('cat_feedback' in locals() and cat_feedback is not None) and
@@ -147,43 +330,42 @@ def main():
                 selected_sum is not None and selected_themes is not None
             ):
                 data = {
-                    "FileName": [uploaded_file.name],
-                    "PredictedCategory":      [str(result.category)],
-                    "CorrectedCategory":      [category_value],
-                    "PredictedSubCategory":   [getattr(result.subcategory, "value", str(result.subcategory))],
-                    "CorrectedSubCategory":   [subcategory_value],
-                    "Summary": [result.summary],
+                    "FileName": uploaded_file.name,
+                    "PredictedCategory":      predicted_category,
+                    "CorrectedCategory":      category_value,
+                    "PredictedSubCategory":   predicted_subcategory,
+                    "CorrectedSubCategory":   subcategory_value,
+                    "Summary": result.summary,
                     "SummarySentiment": selected_sum,
-                    "KeyThemes": ["; ".join(result.key_themes)],
+                    "KeyThemes": "; ".join(result.key_themes),
                     "KeyThemesSentiment": selected_themes,
                 }
-                df = pd.DataFrame(data)
+                # Only needed once all feedback is given, so not imported on every page load
+                import csv
+                import io
+                import zipfile
+
+                # One row per file; same output as pandas' to_csv(index=False)
                 csv_buffer = io.StringIO()
-                df.to_csv(csv_buffer, index=False)
+                writer = csv.writer(csv_buffer, lineterminator="\n")
+                writer.writerow(data.keys())
+                writer.writerow(data.values())
                 csv_data = csv_buffer.getvalue()
-                base_name = os.path.splitext(uploaded_file.name)[0]
+                base_name, _ = split_name(uploaded_file.name)
                 csv_filename = f"{base_name}.csv"
 
-                with tempfile.TemporaryDirectory() as tmpdirname:
-                    csv_path = os.path.join(tmpdirname, csv_filename)
-                    with open(csv_path, "w") as f:
-                        f.write(csv_data)
-                    uploaded_path = os.path.join(tmpdirname, uploaded_file.name)
-                    with open(uploaded_path, "wb") as f:
-                        f.write(uploaded_file.getbuffer())
-                    zip_filename = f"{base_name}.zip"
-                    zip_path = os.path.join(tmpdirname, zip_filename)
-                    with zipfile.ZipFile(zip_path, "w") as zipf:
-                        zipf.write(csv_path, arcname=csv_filename)
-                        zipf.write(uploaded_path, arcname=uploaded_file.name)
-                    with open(zip_path, "rb") as f:
-                        zip_bytes = f.read()
-                    st.download_button(
-                        label="Download Results",
-                        data=zip_bytes,
-                        file_name=zip_filename,
-                        mime="application/zip"
-                    )
+                # Both files are already in memory, so the zip is built there too
+                zip_filename = f"{base_name}.zip"
+                zip_buffer = io.BytesIO()
+                with zipfile.ZipFile(zip_buffer, "w") as zipf:
+                    zipf.writestr(csv_filename, csv_data)
+                    zipf.writestr(uploaded_file.name, uploaded_file.getbuffer())
+                st.download_button(
+                    label="Download Results",
+                    data=zip_buffer.getvalue(),
+                    file_name=zip_filename,
+                    mime="application/zip"
+                )
     else:
         st.info('👆 Please upload at least one file to analyze.')
 